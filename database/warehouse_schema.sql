@@ -1,14 +1,21 @@
 -- Create star schema for warehouse
 
--- Dimension: Patients
+-- Dimension: Patients (SCD Type 2 - one row per version of a patient)
 CREATE TABLE dim_patients (
-    patient_id VARCHAR(20) PRIMARY KEY,
+    patient_key INT PRIMARY KEY,
+    patient_id VARCHAR(20) NOT NULL,
     age INT,
     age_group VARCHAR(20),
     gender VARCHAR(50),
     ethnicity VARCHAR(50),
     socioeconomic_status VARCHAR(20),
-    insurance_type VARCHAR(50)
+    insurance_type VARCHAR(50),
+    
+    -- Version tracking
+    row_hash BIGINT,
+    effective_date DATE,
+    expiration_date DATE,
+    is_current BIT
 );
 
 -- Dimension: Diagnoses
@@ -48,6 +55,7 @@ CREATE TABLE dim_time (
 CREATE TABLE fact_clinical_visits (
     visit_id INT PRIMARY KEY,
     patient_id VARCHAR(20),
+    patient_key INT,
     diagnosis_id INT,
     treatment_id INT,
     facility_id INT,
@@ -61,14 +69,50 @@ CREATE TABLE fact_clinical_visits (
     adverse_event BIT,
     outcome VARCHAR(20),
     
-    FOREIGN KEY (patient_id) REFERENCES dim_patients(patient_id),
+    FOREIGN KEY (patient_key) REFERENCES dim_patients(patient_key),
     FOREIGN KEY (diagnosis_id) REFERENCES dim_diagnoses(diagnosis_id),
     FOREIGN KEY (treatment_id) REFERENCES dim_treatments(treatment_id),
     FOREIGN KEY (facility_id) REFERENCES dim_facilities(facility_id),
     FOREIGN KEY (date_id) REFERENCES dim_time(date_id)
 );
 
+-- Data Quality: Quarantined visits (failed one or more rules in warehouse_etl.py)
+CREATE TABLE dq_quarantine_clinical_visits (
+    quarantine_id INT IDENTITY(1,1) PRIMARY KEY,
+    visit_id INT,
+    patient_id VARCHAR(20),
+    diagnosis VARCHAR(200),
+    treatment VARCHAR(200),
+    facility_name VARCHAR(100),
+    date_id INT,
+    length_of_stay_days INT,
+    total_cost DECIMAL(10,2),
+    patient_satisfaction_score INT,
+    failed_rules VARCHAR(500),
+    quarantined_at DATETIME DEFAULT GETDATE()
+);
+
+-- Data Quality: Per-rule pass counts for each ETL run
+CREATE TABLE dq_rule_results (
+    result_id INT IDENTITY(1,1) PRIMARY KEY,
+    run_timestamp DATETIME,
+    rule_name VARCHAR(100),
+    check_type VARCHAR(50),
+    column_name VARCHAR(100),
+    rows_checked INT,
+    rows_passed INT,
+    rows_failed INT
+);
+
+-- ETL: Load log (MAX(loaded_at) is the watermark for cached warehouse reads)
+CREATE TABLE etl_load_log (
+    load_id INT IDENTITY(1,1) PRIMARY KEY,
+    loaded_at DATETIME,
+    visits_loaded INT
+);
+
 -- Indexes for performance
+CREATE INDEX idx_patients_current ON dim_patients(patient_id, is_current);
 CREATE INDEX idx_visits_patient ON fact_clinical_visits(patient_id);
 CREATE INDEX idx_visits_date ON fact_clinical_visits(date_id);
 CREATE INDEX idx_visits_diagnosis ON fact_clinical_visits(diagnosis_id);
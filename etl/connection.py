@@ -0,0 +1,107 @@
+"""
+Shared database connections for the warehouse and data mart ETL
+Engines are created on first use and reused by every pipeline stage
+"""
+
+import os
+import urllib.parse
+
+from sqlalchemy import create_engine, event
+
+from local_schema import create_local_schema
+
+# Backend: azure_sql (default), sqlite or duckdb for local runs
+ETL_BACKEND = os.environ.get('ETL_BACKEND', 'azure_sql')
+
+# Parallelism of the pipeline; also sizes the connection pool
+ETL_WORKERS = int(os.environ.get('ETL_WORKERS', os.cpu_count() or 1))
+
+# Azure SQL connection
+server = os.environ.get('AZURE_SQL_SERVER', 'YOUR-SERVER-NAME.database.windows.net')
+database = os.environ.get('AZURE_SQL_DATABASE', 'HealthcareAnalytics')
+username = os.environ.get('AZURE_SQL_USERNAME', 'YOUR-SQL-USERNAME')
+password = os.environ.get('AZURE_SQL_PASSWORD', 'YOUR-SQL-PASSWORD')
+connect_timeout = int(os.environ.get('AZURE_SQL_CONNECT_TIMEOUT', 120))
+
+# Local database files
+LOCAL_DB_PATH = os.environ.get('ETL_LOCAL_DB_PATH', 'healthcare_analytics')
+
+_engines = {}
+
+
+def _azure_sql_url():
+    odbc_str = (
+        "Driver={ODBC Driver 18 for SQL Server};"
+        f"Server=tcp:{server},1433;"
+        f"Database={database};"
+        f"Uid={username};"
+        f"Pwd={password};"
+        "Encrypt=yes;"
+        "TrustServerCertificate=yes;"
+        f"Connection Timeout={connect_timeout};"
+    )
+    return "mssql+pyodbc:///?odbc_connect=" + urllib.parse.quote_plus(odbc_str)
+
+
+def _sqlite_url():
+    return f"sqlite:///{LOCAL_DB_PATH}.db"
+
+
+def _duckdb_url():
+    # Requires the duckdb-engine package
+    return f"duckdb:///{LOCAL_DB_PATH}.duckdb"
+
+
+BACKENDS = {
+    'azure_sql': _azure_sql_url,
+    'sqlite': _sqlite_url,
+    'duckdb': _duckdb_url,
+}
+
+
+def _attach_research_operations(dbapi_conn, connection_record):
+    """SQLite has no schemas; attach the data mart as a second database file"""
+    dbapi_conn.execute(f"ATTACH DATABASE '{LOCAL_DB_PATH}_research_operations.db' AS research_operations")
+
+
+def get_engine(backend=None, pool_size=None):
+    """
+    Return the shared engine for a backend, creating it on first use.
+
+    For Azure SQL no connection is opened here; the pool connects on first
+    query and keeps up to pool_size (default ETL_WORKERS) connections warm for
+    later stages. Local backends create any missing tables on first use.
+    """
+    backend = backend or ETL_BACKEND
+    if backend in _engines:
+        return _engines[backend]
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown ETL backend '{backend}' (expected one of: {', '.join(BACKENDS)})")
+
+    # Batched parameter arrays for to_sql on SQL Server
+    options = {'fast_executemany': True} if backend == 'azure_sql' else {}
+
+    engine = create_engine(
+        BACKENDS[backend](),
+        pool_pre_ping=True,
+        pool_size=pool_size or ETL_WORKERS,
+        max_overflow=0,
+        **options
+    )
+    if backend == 'sqlite':
+        event.listen(engine, 'connect', _attach_research_operations)
+
+    # Azure SQL is set up from database/*.sql; local files get the same tables here
+    if backend in ('sqlite', 'duckdb'):
+        create_local_schema(engine)
+
+    _engines[backend] = engine
+    return engine
+
+
+def dispose_engines():
+    """Close all pooled connections at the end of a run"""
+    for engine in _engines.values():
+        engine.dispose()
+    _engines.clear()
@@ -0,0 +1,138 @@
+"""
+Data quality: declarative row-level rules for fact_clinical_visits
+Failing rows are quarantined with their reasons instead of loaded with NULL keys
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# ==============================================================================
+# RULES - One entry per check, evaluated together on every chunk
+# ==============================================================================
+
+# Expected length of stay (days) per diagnosis, as in CLINICAL_PATTERNS
+# (data/generate_clinical_data.py); a diagnosis not listed here fails the check
+LOS_RANGES = {
+    'Type 2 Diabetes': (0, 2),
+    'Hypertension': (0, 1),
+    'Depression': (0, 0),
+    'Generalized Anxiety Disorder': (0, 0),
+    'Asthma': (0, 1),
+    'Coronary Artery Disease': (2, 7),
+    'COPD': (1, 5),
+    'Pneumonia': (3, 7),
+    'Osteoarthritis': (0, 4),
+    'Hip Fracture': (4, 8),
+    'Acute Appendicitis': (1, 3),
+    'Breast Cancer': (1, 5),
+    'Colorectal Cancer': (5, 10),
+    'Migraine': (0, 0),
+    'Lower Back Pain': (0, 3),
+    'Cellulitis': (0, 4),
+    'Urinary Tract Infection': (0, 2),
+    'Acute Bronchitis': (0, 0),
+    'Gastroesophageal Reflux Disease': (0, 2),
+    'Atrial Fibrillation': (1, 4),
+}
+
+DATA_QUALITY_RULES = [
+    # Referential integrity (left merges leave NULL keys on a miss)
+    {'name': 'patient_version_exists', 'check': 'not_null', 'column': 'patient_key'},
+    {'name': 'diagnosis_exists', 'check': 'not_null', 'column': 'diagnosis_id'},
+    {'name': 'treatment_exists', 'check': 'not_null', 'column': 'treatment_id'},
+    {'name': 'facility_exists', 'check': 'not_null', 'column': 'facility_id'},
+
+    # Value ranges
+    {'name': 'satisfaction_1_to_10', 'check': 'between', 'column': 'patient_satisfaction_score', 'min': 1, 'max': 10},
+    {'name': 'cost_non_negative', 'check': 'between', 'column': 'total_cost', 'min': 0},
+    {'name': 'los_within_diagnosis_range', 'check': 'range_by_key', 'column': 'length_of_stay_days',
+     'key': 'diagnosis', 'ranges': LOS_RANGES},
+]
+
+
+# ==============================================================================
+# CHECKS - Each returns a boolean pass mask for the whole chunk
+# ==============================================================================
+
+def _not_null(chunk, rule):
+    return chunk[rule['column']].notna()
+
+
+def _in_bounds(values, lower, upper):
+    """Pass when non-null and inside the bounds"""
+    passed = values.notna()
+    if lower is not None:
+        passed &= ~(values < lower)
+    if upper is not None:
+        passed &= ~(values > upper)
+    return passed
+
+
+def _between(chunk, rule):
+    return _in_bounds(chunk[rule['column']], rule.get('min'), rule.get('max'))
+
+
+def _range_by_key(chunk, rule):
+    """Bounds looked up per row from a {key: (min, max)} mapping; unknown keys fail"""
+    # One hash lookup per row; get_indexer returns -1 for keys not in ranges
+    ranges = rule['ranges']
+    positions = pd.Index(list(ranges)).get_indexer(chunk[rule['key']])
+    bounds = np.array(list(ranges.values()), dtype=float)[np.maximum(positions, 0)]
+    known = pd.Series(positions >= 0, index=chunk.index)
+    return known & _in_bounds(chunk[rule['column']], bounds[:, 0], bounds[:, 1])
+
+
+CHECKS = {
+    'not_null': _not_null,
+    'between': _between,
+    'range_by_key': _range_by_key,
+}
+
+
+# ==============================================================================
+# STAGE
+# ==============================================================================
+
+def run_quality_checks(chunk, rules=DATA_QUALITY_RULES):
+    """
+    Evaluate every rule over the chunk in one vectorized pass.
+
+    Returns (clean, quarantined, passed): the rows passing all rules, the
+    failing rows with a ';'-separated failed_rules column, and the number of
+    rows that passed each rule (Series indexed by rule name).
+    """
+    unknown = [rule['check'] for rule in rules if rule['check'] not in CHECKS]
+    if unknown:
+        raise ValueError(f"Unknown data quality check(s): {', '.join(unknown)}")
+
+    names = [rule['name'] for rule in rules]
+    results = np.column_stack(
+        [CHECKS[rule['check']](chunk, rule).to_numpy(dtype=bool) for rule in rules]
+    ) if rules else np.ones((len(chunk), 0), dtype=bool)
+
+    passed = pd.Series(results.sum(axis=0), index=names, dtype='int64')
+    ok = results.all(axis=1)
+
+    quarantined = chunk[~ok].copy()
+    if len(quarantined):
+        # bool x str dot product concatenates the names of the failed rules
+        failures = pd.DataFrame(~results[~ok], columns=names, index=quarantined.index)
+        quarantined['failed_rules'] = failures.dot(pd.Index(names) + ';').str.rstrip(';')
+    else:
+        quarantined['failed_rules'] = pd.Series(dtype=object)
+
+    return chunk[ok], quarantined, passed
+
+
+def summarize_rule_results(passed, rows_checked, rules=DATA_QUALITY_RULES):
+    """Per-rule pass counts as a frame ready for dq_rule_results"""
+    summary = pd.DataFrame({
+        'rule_name': [rule['name'] for rule in rules],
+        'check_type': [rule['check'] for rule in rules],
+        'column_name': [rule['column'] for rule in rules],
+    })
+    summary['rows_checked'] = rows_checked
+    summary['rows_passed'] = summary['rule_name'].map(passed).fillna(0).astype('int64')
+    summary['rows_failed'] = summary['rows_checked'] - summary['rows_passed']
+    return summary
@@ -0,0 +1,147 @@
+"""
+Intervention events: derive program enrollments for fact_patient_interventions
+Patients are matched to each program's target population in vectorized batches
+"""
+
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# TARGETING - Who each program enrolls, and which care team delivers it
+# ==============================================================================
+
+# diagnoses / diagnosis_categories match a qualifying visit; patient_flag
+# matches any visit of a patient whose summary column is > 0. Enrollment only
+# happens at facilities with a care team of the program's specialty.
+INTERVENTION_TARGETS = {
+    'Diabetes Management Program': {
+        'diagnoses': ['Type 2 Diabetes'],
+        'specialty': 'Primary Care',
+        'duration_days': 180,
+    },
+    'Cardiac Rehabilitation': {
+        'diagnosis_categories': ['Cardiovascular'],
+        'specialty': 'Cardiology',
+        'duration_days': 84,
+    },
+    'High-Risk Patient Monitoring': {
+        'patient_flag': 'readmissions_30_day',
+        'specialty': 'Emergency Medicine',
+        'duration_days': 30,
+    },
+    'Mental Health Support Group': {
+        'diagnoses': ['Depression', 'Generalized Anxiety Disorder'],
+        'specialty': 'Psychiatry',
+        'duration_days': 90,
+    },
+    'Medication Adherence Program': {
+        'patient_flag': 'chronic_condition_count',
+        'specialty': 'Primary Care',
+        'duration_days': 120,
+    },
+}
+
+# Enrollment follows the qualifying visit within this many days
+MAX_ENROLLMENT_DELAY_DAYS = 30
+DECLINE_RATE = 0.20
+
+# Rows per INSERT batch when loading events
+LOAD_CHUNK_SIZE = 50_000
+
+VISIT_QUERY = """
+SELECT
+    v.patient_id,
+    d.diagnosis_name,
+    d.diagnosis_category,
+    f.facility_name,
+    t.full_date as visit_date
+FROM fact_clinical_visits v
+JOIN dim_diagnoses d ON v.diagnosis_id = d.diagnosis_id
+JOIN dim_facilities f ON v.facility_id = f.facility_id
+JOIN dim_time t ON v.date_id = t.date_id
+"""
+
+
+def _qualifying_visits(visits, patient_summary, target):
+    """Boolean mask of visits that qualify a patient for the program"""
+    if 'patient_flag' in target:
+        flagged = (patient_summary[target['patient_flag']] > 0).to_numpy()
+        return pd.Series(flagged[visits['patient_code'].to_numpy()], index=visits.index)
+
+    mask = pd.Series(False, index=visits.index)
+    if 'diagnoses' in target:
+        mask |= visits['diagnosis_name'].isin(target['diagnoses'])
+    if 'diagnosis_categories' in target:
+        mask |= visits['diagnosis_category'].isin(target['diagnosis_categories'])
+    return mask
+
+
+def generate_intervention_events(visits, patient_summary, interventions, care_teams,
+                                 today=None, seed=42):
+    """
+    Build fact_patient_interventions rows.
+
+    visits          - VISIT_QUERY result (one row per visit)
+    patient_summary - fact_patient_summary frame (for risk flags)
+    interventions   - dim_interventions with intervention_id
+    care_teams      - dim_care_teams (specialty, facility_name)
+
+    Each program is evaluated over all visits at once. A patient is enrolled
+    at most once per program, after their first qualifying visit and never
+    later than today.
+    """
+    today = pd.Timestamp(today or pd.Timestamp.now().normalize())
+    rng = np.random.default_rng(seed)
+
+    # Hash each string once: patients to summary row positions, the
+    # low-cardinality columns to categoricals that the per-program masks reuse
+    visits = visits.assign(
+        patient_code=pd.Index(patient_summary['patient_id']).get_indexer(visits['patient_id'])
+    )
+    visits = visits[visits['patient_code'] >= 0]
+    visits = visits.assign(
+        diagnosis_name=visits['diagnosis_name'].astype('category'),
+        diagnosis_category=visits['diagnosis_category'].astype('category'),
+        facility_name=visits['facility_name'].astype('category'),
+        visit_date=pd.to_datetime(visits['visit_date']),
+    ).sort_values('visit_date', kind='stable')
+
+    intervention_ids = interventions.set_index('intervention_name')['intervention_id']
+
+    batches = []
+    for name, target in INTERVENTION_TARGETS.items():
+        if name not in intervention_ids:
+            continue
+
+        facilities = care_teams.loc[care_teams['specialty'] == target['specialty'], 'facility_name']
+        mask = _qualifying_visits(visits, patient_summary, target) & visits['facility_name'].isin(facilities)
+
+        enrolled = visits.loc[mask, ['patient_id', 'patient_code', 'visit_date']].drop_duplicates(subset=['patient_code'])
+        n = len(enrolled)
+        if n == 0:
+            continue
+
+        intervention_date = enrolled['visit_date'] + pd.to_timedelta(
+            rng.integers(0, MAX_ENROLLMENT_DELAY_DAYS + 1, n), unit='D'
+        )
+        finished = intervention_date + pd.Timedelta(days=target['duration_days']) <= today
+        outcome = np.where(
+            rng.random(n) < DECLINE_RATE, 'Declined',
+            np.where(finished, 'Completed', 'In Progress')
+        )
+
+        # Enrollments that would fall after today have not happened yet
+        due = (intervention_date <= today).to_numpy()
+        if not due.any():
+            continue
+
+        batches.append(pd.DataFrame({
+            'patient_id': enrolled['patient_id'].to_numpy()[due],
+            'intervention_id': int(intervention_ids[name]),
+            'intervention_date': intervention_date.to_numpy()[due],
+            'outcome': outcome[due],
+        }))
+
+    if not batches:
+        return pd.DataFrame(columns=['patient_id', 'intervention_id', 'intervention_date', 'outcome'])
+    return pd.concat(batches, ignore_index=True)
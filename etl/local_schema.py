@@ -0,0 +1,200 @@
+"""
+Local schema: SQLite/DuckDB equivalent of database/*.sql
+Keep in step with warehouse_schema.sql and datamart_schema.sql
+"""
+
+from sqlalchemy import (BigInteger, Boolean, Column, Date, DateTime, ForeignKey, ForeignKeyConstraint, Index,
+                        Integer, MetaData, Numeric, Sequence, String, Table, func, text)
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn
+
+MART = 'research_operations'
+
+metadata = MetaData()
+
+
+def _identity(name):
+    """Auto-numbered primary key (T-SQL IDENTITY(1,1)); DuckDB needs a sequence"""
+    return Column(name, Integer, Sequence(f'{name}_seq'), primary_key=True)
+
+
+@compiles(CreateColumn, 'duckdb')
+def _duckdb_sequence_default(element, compiler, **kw):
+    """Fill identity columns server-side, since to_sql inserts omit them"""
+    column = element.element
+    ddl = compiler.visit_create_column(element, **kw)
+    if isinstance(column.default, Sequence):
+        ddl += f" DEFAULT nextval('{column.default.name}')"
+    return ddl
+
+
+# ==============================================================================
+# WAREHOUSE
+# ==============================================================================
+
+Table(
+    'dim_patients', metadata,
+    Column('patient_key', Integer, primary_key=True, autoincrement=False),
+    Column('patient_id', String(20), nullable=False),
+    Column('age', Integer),
+    Column('age_group', String(20)),
+    Column('gender', String(50)),
+    Column('ethnicity', String(50)),
+    Column('socioeconomic_status', String(20)),
+    Column('insurance_type', String(50)),
+    Column('row_hash', BigInteger),
+    Column('effective_date', Date),
+    Column('expiration_date', Date),
+    Column('is_current', Boolean),
+    Index('idx_patients_current', 'patient_id', 'is_current'),
+)
+
+Table(
+    'dim_diagnoses', metadata,
+    _identity('diagnosis_id'),
+    Column('diagnosis_name', String(200)),
+    Column('icd_10_code', String(10)),
+    Column('diagnosis_category', String(100)),
+)
+
+Table(
+    'dim_treatments', metadata,
+    _identity('treatment_id'),
+    Column('treatment_name', String(200)),
+    Column('treatment_type', String(50)),
+)
+
+Table(
+    'dim_facilities', metadata,
+    _identity('facility_id'),
+    Column('facility_name', String(100)),
+    Column('facility_type', String(50)),
+)
+
+Table(
+    'dim_time', metadata,
+    Column('date_id', Integer, primary_key=True, autoincrement=False),
+    Column('full_date', Date),
+    Column('year', Integer),
+    Column('quarter', Integer),
+    Column('month', Integer),
+    Column('month_name', String(20)),
+    Column('day_of_week', String(20)),
+)
+
+Table(
+    'fact_clinical_visits', metadata,
+    Column('visit_id', Integer, primary_key=True, autoincrement=False),
+    Column('patient_id', String(20), index=True),
+    Column('patient_key', Integer),
+    Column('diagnosis_id', Integer, ForeignKey('dim_diagnoses.diagnosis_id'), index=True),
+    Column('treatment_id', Integer, ForeignKey('dim_treatments.treatment_id')),
+    Column('facility_id', Integer, ForeignKey('dim_facilities.facility_id')),
+    Column('date_id', Integer, ForeignKey('dim_time.date_id'), index=True),
+    Column('length_of_stay_days', Integer),
+    Column('total_cost', Numeric(10, 2)),
+    Column('readmission_30_days', Boolean),
+    Column('patient_satisfaction_score', Integer),
+    Column('adverse_event', Boolean),
+    Column('outcome', String(20)),
+    # DuckDB rejects any UPDATE of a referenced row, which would block
+    # expire_versions on dim_patients; keep this key SQLite-only
+    ForeignKeyConstraint(['patient_key'], ['dim_patients.patient_key']).ddl_if(dialect='sqlite'),
+)
+
+Table(
+    'dq_quarantine_clinical_visits', metadata,
+    _identity('quarantine_id'),
+    Column('visit_id', Integer),
+    Column('patient_id', String(20)),
+    Column('diagnosis', String(200)),
+    Column('treatment', String(200)),
+    Column('facility_name', String(100)),
+    Column('date_id', Integer),
+    Column('length_of_stay_days', Integer),
+    Column('total_cost', Numeric(10, 2)),
+    Column('patient_satisfaction_score', Integer),
+    Column('failed_rules', String(500)),
+    Column('quarantined_at', DateTime, server_default=func.current_timestamp()),
+)
+
+Table(
+    'dq_rule_results', metadata,
+    _identity('result_id'),
+    Column('run_timestamp', DateTime),
+    Column('rule_name', String(100)),
+    Column('check_type', String(50)),
+    Column('column_name', String(100)),
+    Column('rows_checked', Integer),
+    Column('rows_passed', Integer),
+    Column('rows_failed', Integer),
+)
+
+Table(
+    'etl_load_log', metadata,
+    _identity('load_id'),
+    Column('loaded_at', DateTime),
+    Column('visits_loaded', Integer),
+)
+
+# ==============================================================================
+# DATA MART
+# ==============================================================================
+
+Table(
+    'fact_patient_summary', metadata,
+    Column('patient_id', String(20), primary_key=True),
+    Column('age', Integer),
+    Column('age_group', String(20)),
+    Column('gender', String(50)),
+    Column('ethnicity', String(50)),
+    Column('insurance_type', String(50)),
+    Column('total_visits', Integer),
+    Column('first_visit_date', Date),
+    Column('last_visit_date', Date, index=True),
+    Column('days_since_last_visit', Integer),
+    Column('total_cost', Numeric(12, 2)),
+    Column('average_satisfaction_score', Numeric(3, 1)),
+    Column('readmissions_30_day', Integer),
+    Column('adverse_events_count', Integer),
+    Column('high_risk_patient', Boolean, index=True),
+    Column('chronic_condition_count', Integer),
+    Column('last_updated', DateTime, server_default=func.current_timestamp()),
+    schema=MART,
+)
+
+Table(
+    'dim_care_teams', metadata,
+    _identity('team_id'),
+    Column('team_name', String(100)),
+    Column('specialty', String(100)),
+    Column('facility_name', String(100)),
+    schema=MART,
+)
+
+Table(
+    'dim_interventions', metadata,
+    _identity('intervention_id'),
+    Column('intervention_name', String(100)),
+    Column('intervention_type', String(50)),
+    Column('target_population', String(100)),
+    schema=MART,
+)
+
+Table(
+    'fact_patient_interventions', metadata,
+    _identity('intervention_event_id'),
+    Column('patient_id', String(20), ForeignKey(f'{MART}.fact_patient_summary.patient_id'), index=True),
+    Column('intervention_id', Integer, ForeignKey(f'{MART}.dim_interventions.intervention_id')),
+    Column('intervention_date', Date, index=True),
+    Column('outcome', String(50)),
+    schema=MART,
+)
+
+
+def create_local_schema(engine):
+    """Create any missing warehouse and data mart tables on a local backend"""
+    with engine.begin() as conn:
+        if engine.dialect.name == 'duckdb':
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {MART}"))
+        metadata.create_all(conn, checkfirst=True)
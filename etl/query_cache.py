@@ -0,0 +1,89 @@
+"""
+Query cache: read-through cache for warehouse reads
+Entries are keyed by database, normalized SQL, parameters and the warehouse load watermark
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+CACHE_DIR = os.environ.get('ETL_CACHE_DIR', '.query_cache')
+CACHE_MAX_BYTES = int(os.environ.get('ETL_CACHE_MAX_MB', 1024)) * 1024 * 1024
+
+# Written by warehouse_etl.py after every committed fact load
+WATERMARK_QUERY = "SELECT MAX(loaded_at) FROM etl_load_log"
+
+
+def normalize_sql(sql):
+    """Collapse whitespace so formatting-only differences share an entry"""
+    return ' '.join(sql.split())
+
+
+def read_watermark(engine):
+    """Latest warehouse load time, or None when the warehouse has no load log yet"""
+    if not inspect(engine).has_table('etl_load_log'):
+        return None
+    with engine.connect() as conn:
+        return conn.execute(text(WATERMARK_QUERY)).scalar()
+
+
+def _engine_identity(engine):
+    """Engine URL without credentials, so each database gets its own entries"""
+    url = engine.url.set(password=None)
+    # Azure SQL carries the password inside the odbc_connect string
+    odbc = url.query.get('odbc_connect')
+    if odbc:
+        odbc = ';'.join(part for part in odbc.split(';') if not part.strip().lower().startswith('pwd='))
+        url = url.update_query_dict({'odbc_connect': odbc})
+    return url.render_as_string(hide_password=True)
+
+
+def _cache_path(database, sql, params, watermark):
+    key = json.dumps([database, normalize_sql(sql), params or {}, watermark], sort_keys=True, default=str)
+    return os.path.join(CACHE_DIR, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.pkl')
+
+
+def _evict(max_bytes=CACHE_MAX_BYTES):
+    """Drop least recently used entries until the cache fits in max_bytes"""
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith('.pkl'):
+            stat = os.stat(os.path.join(CACHE_DIR, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(os.path.join(CACHE_DIR, name))
+        total -= size
+
+
+def cached_read_sql(sql, engine, params=None):
+    """
+    pd.read_sql with a local result cache.
+
+    A new warehouse load changes the watermark and therefore every key, so
+    stale entries are never served; they age out through LRU eviction.
+    Without a watermark the query always goes to the warehouse.
+    """
+    watermark = read_watermark(engine)
+    if watermark is None:
+        return pd.read_sql(text(sql), engine, params=params)
+
+    path = _cache_path(_engine_identity(engine), sql, params, watermark)
+    if os.path.exists(path):
+        os.utime(path)  # mark as recently used
+        return pd.read_pickle(path)
+
+    result = pd.read_sql(text(sql), engine, params=params)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    result.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+    _evict()
+    return result
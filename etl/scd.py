@@ -0,0 +1,159 @@
+"""
+Slowly changing dimensions: Type 2 history for dim_patients
+Change detection compares row hashes of tracked attributes, never whole rows
+"""
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, text
+
+# Validity window for first and open-ended versions
+SCD_START_DATE = pd.Timestamp('1900-01-01')
+SCD_END_DATE = pd.Timestamp('9999-12-31')
+
+# Attribute changes that open a new dim_patients version
+PATIENT_TRACKED_ATTRIBUTES = ['age_group', 'gender', 'ethnicity', 'socioeconomic_status', 'insurance_type']
+
+# last_seen_date is the latest visit already loaded against each version
+HASH_INDEX_QUERY = """
+SELECT p.patient_id, p.patient_key, p.row_hash, p.effective_date, p.is_current, v.last_seen_date
+FROM dim_patients p
+LEFT JOIN (
+    SELECT f.patient_key, MAX(t.full_date) AS last_seen_date
+    FROM fact_clinical_visits f
+    JOIN dim_time t ON f.date_id = t.date_id
+    GROUP BY f.patient_key
+) v ON v.patient_key = p.patient_key
+"""
+
+
+def row_hash(df, columns):
+    """Vectorized 64-bit hash of the given columns, stored as BIGINT"""
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy().view(np.int64)
+
+
+def load_hash_index(engine):
+    """
+    Read the narrow version index (keys, hashes, effective and last-seen
+    dates) of dim_patients. Attribute columns are never read back for
+    comparison. A warehouse without dim_patients yet has an empty index.
+    """
+    if not inspect(engine).has_table('dim_patients'):
+        index = pd.DataFrame({
+            'patient_id': pd.Series(dtype=object),
+            'patient_key': pd.Series(dtype=np.int64),
+            'row_hash': pd.Series(dtype=np.int64),
+            'effective_date': pd.Series(dtype='datetime64[ns]'),
+            'is_current': pd.Series(dtype=bool),
+            'last_seen_date': pd.Series(dtype='datetime64[ns]'),
+        })
+    else:
+        index = pd.read_sql(text(HASH_INDEX_QUERY), engine)
+    index['effective_date'] = pd.to_datetime(index['effective_date']).astype('datetime64[ns]')
+    index['last_seen_date'] = pd.to_datetime(index['last_seen_date']).astype('datetime64[ns]')
+    index['row_hash'] = index['row_hash'].astype(np.int64)
+    index['is_current'] = index['is_current'].astype(bool)
+    return index
+
+
+def detect_changes(incoming, hash_index, key='patient_id', date_col='visit_date',
+                   tracked=PATIENT_TRACKED_ATTRIBUTES, surrogate_key='patient_key'):
+    """
+    Diff an extract against the current versions in hash_index.
+
+    incoming holds one row per observation (e.g. per visit) with the tracked
+    attributes as seen on date_col. Rows dated on or before the latest date
+    already recorded for a patient (any version's effective or last-seen
+    date) are ignored, so re-sent and late-arriving history never duplicates
+    or back-dates versions. Several rows for a patient on one date count as
+    the last of them. Returns (inserts, expires):
+      inserts - new version rows with surrogate keys, row_hash,
+                effective_date, expiration_date and is_current
+      expires - surrogate_key and expiration_date of current versions that
+                the extract supersedes
+    """
+    current = hash_index[hash_index['is_current']].set_index(key)
+
+    # History up to the latest recorded date is settled; rows from that span
+    # (re-sent or late-arriving) must not reopen it. Facts loaded against a
+    # version pin it, so recorded_until covers last_seen_date as well.
+    # (get_indexer gives -1 for new patients, which lands on the trailing NaT)
+    recorded_until = hash_index.groupby(key)[['effective_date', 'last_seen_date']].max().max(axis=1)
+    positions = recorded_until.index.get_indexer(incoming[key])
+    recorded = np.append(recorded_until.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))[positions]
+    already_versioned = incoming[date_col].to_numpy(dtype='datetime64[ns]') <= recorded
+
+    # One observation per patient and date: the last row sent for that day
+    observed = (
+        incoming[~already_versioned]
+        .sort_values([key, date_col], kind='stable')
+        .drop_duplicates(subset=[key, date_col], keep='last')
+        .reset_index(drop=True)
+    )
+    observed['row_hash'] = row_hash(observed, tracked)
+
+    # Keep only the rows where a patient's hash differs from their previous row
+    new_key = observed[key].ne(observed[key].shift())
+    changed = new_key | observed['row_hash'].ne(observed['row_hash'].shift())
+    versions = observed[changed].reset_index(drop=True)
+
+    current_hash = versions[key].map(current['row_hash'])
+
+    # A patient's first version in the extract is a no-op if it matches the current hash
+    first = versions[key].ne(versions[key].shift())
+    versions = versions[~(first & current_hash.eq(versions['row_hash']))].reset_index(drop=True)
+
+    first = versions[key].ne(versions[key].shift())
+    last = versions[key].ne(versions[key].shift(-1))
+    existing = versions[key].isin(current.index)
+
+    versions['effective_date'] = versions[date_col].where(~first | existing, SCD_START_DATE)
+    next_effective = versions['effective_date'].shift(-1) - pd.Timedelta(days=1)
+    versions['expiration_date'] = next_effective.where(~last, SCD_END_DATE)
+    versions['is_current'] = last
+
+    start = int(hash_index[surrogate_key].max()) + 1 if len(hash_index) else 1
+    versions[surrogate_key] = np.arange(start, start + len(versions))
+
+    superseded = versions[first & existing]
+    expires = pd.DataFrame({
+        surrogate_key: superseded[key].map(current[surrogate_key]).astype(np.int64).to_numpy(),
+        'expiration_date': (superseded['effective_date'] - pd.Timedelta(days=1)).to_numpy(),
+    })
+
+    inserts = versions.drop(columns=[date_col])
+    return inserts, expires
+
+
+def resolve_versions(facts, hash_index, key='patient_id', date_col='visit_date', surrogate_key='patient_key'):
+    """Surrogate key of the version valid on each fact row's date (NA when none)"""
+    left = pd.DataFrame({
+        key: facts[key].to_numpy(),
+        date_col: facts[date_col].astype('datetime64[ns]').to_numpy(),
+        '_row': np.arange(len(facts)),
+    }).sort_values(date_col, kind='stable')
+    right = pd.DataFrame({
+        key: hash_index[key].to_numpy(),
+        surrogate_key: hash_index[surrogate_key].to_numpy(),
+        'effective_date': hash_index['effective_date'].astype('datetime64[ns]').to_numpy(),
+    }).sort_values('effective_date', kind='stable')
+
+    matched = pd.merge_asof(left, right, left_on=date_col, right_on='effective_date', by=key)
+
+    resolved = np.full(len(facts), np.nan)
+    resolved[matched['_row'].to_numpy()] = matched[surrogate_key].to_numpy(dtype=float)
+    return pd.Series(resolved, index=facts.index, name=surrogate_key).astype('Int64')
+
+
+def expire_versions(conn, expires, table='dim_patients', surrogate_key='patient_key'):
+    """Close out superseded versions in one batched UPDATE"""
+    if expires.empty:
+        return
+    conn.execute(
+        text(f"UPDATE {table} SET expiration_date = :expiration_date, is_current = 0 "
+             f"WHERE {surrogate_key} = :{surrogate_key}"),
+        [
+            {surrogate_key: int(k), 'expiration_date': d.date()}
+            for k, d in zip(expires[surrogate_key], pd.to_datetime(expires['expiration_date']))
+        ],
+    )